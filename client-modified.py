@@ -14,105 +14,257 @@ import socket
 import struct
 import os
 import sys
+import errno
+import logging
 
-def send_message(sock, message):
+try:
+    import fcntl  # Used to enlarge the splice pipe (Linux only)
+except ImportError:
+    fcntl = None
+
+# Wire integers in network byte order (big-endian), pre-compiled once so
+# each message skips the format-string lookup
+_U16 = struct.Struct('!H')  # Filename length (2 bytes)
+_U32 = struct.Struct('!I')  # Message length header (4 bytes)
+_U64 = struct.Struct('!Q')  # File size (8 bytes)
+
+# Largest control message accepted by recv_message (file content is streamed)
+MAX_MESSAGE_SIZE = 1024 * 1024  # 1MB
+
+# Protocol messages
+HELLO_MSG = b"Hello"
+
+# Session opcodes: 1 byte sent after the large test message
+END_OF_SESSION = b'\x00'  # No more data, server is closing
+FILE_FOLLOWS = b'\x01'    # A file transfer follows (send_file protocol)
+
+# Socket tuning
+ENABLE_NODELAY = True  # Disable Nagle so short handshake messages go out immediately
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # 4MB receive buffer for bulk transfers
+
+# Logging (per-message and progress details are DEBUG, formatted only when enabled)
+LOG_LEVEL = logging.INFO
+PROGRESS_INTERVAL = 4 * 1024 * 1024  # Log transfer progress every 4MB
+
+log = logging.getLogger(__name__)
+
+# File transfer
+RECV_BUFFER_SIZE = 64 * 1024  # Lookahead read size for framed messages
+FILE_CHUNK_SIZE = 1024 * 1024  # 1MB receive chunks
+USE_SPLICE = True  # Move file data socket -> pipe -> file inside the kernel (Linux)
+_SPLICE_UNSUPPORTED = (errno.EINVAL, errno.ENOSYS)  # Socket/filesystem can't splice
+
+# Shared transfer buffer, reused by every file receive (one transfer at a time)
+_XFER_BUF = bytearray(FILE_CHUNK_SIZE)
+_XFER_MV = memoryview(_XFER_BUF)
+
+def tune_socket(sock):
+    """
+    Apply TCP options for low-latency messages and high-throughput transfers
+    """
+    if ENABLE_NODELAY:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+
+def send_bytes(sock, message_bytes):
     """
-    Send a message with length prefix (robust transmission)
+    Send an already-encoded message with length prefix (robust transmission)
     Protocol: [4-byte length][message data]
     Length is in network byte order (big-endian)
     """
     try:
-        # Encode message to bytes
-        if isinstance(message, str):
-            message_bytes = message.encode('utf-8')
-        else:
-            message_bytes = message
-        
         # Get message length
         message_length = len(message_bytes)
         
         # Pack length as 4-byte unsigned integer in network byte order (big-endian)
-        length_header = struct.pack('!I', message_length)  # '!' = network byte order
+        length_header = _U32.pack(message_length)
         
-        # Send length header first (4 bytes)
-        sock.sendall(length_header)
-        print(f"📏 Sent length header: {message_length} bytes")
-        
-        # Send the actual message data
-        sock.sendall(message_bytes)
-        print(f"📤 Sent message: {message_length} bytes")
+        # Send header and data together (one syscall instead of two)
+        if hasattr(sock, 'sendmsg'):
+            # Scatter-gather: the kernel takes both buffers at once
+            sent = sock.sendmsg([length_header, message_bytes])
+            
+            # sendmsg may send only part of the data, finish the rest
+            if sent < 4:
+                sock.sendall(length_header[sent:])
+                sock.sendall(message_bytes)
+            elif sent < 4 + message_length:
+                sock.sendall(memoryview(message_bytes)[sent - 4:])
+        elif message_length < 64 * 1024:
+            # Small message: a single copy is cheaper than a second syscall
+            sock.sendall(length_header + message_bytes)
+        else:
+            sock.sendall(length_header)
+            sock.sendall(message_bytes)
+        log.debug("📏 Sent length header: %d bytes", message_length)
+        log.debug("📤 Sent message: %d bytes", message_length)
         
         return True
     except Exception as e:
-        print(f"❌ Error sending message: {e}")
+        log.error("❌ Error sending message: %s", e)
         return False
 
-def recv_exact(sock, n_bytes):
+def send_text(sock, text):
     """
-    Receive exactly n_bytes from socket (guaranteed complete reception)
-    Handles partial receives that can happen with TCP
+    Encode and send a text message (ASCII fast path, UTF-8 otherwise)
+    """
+    return send_bytes(sock, text.encode('ascii' if text.isascii() else 'utf-8'))
+
+class MessageReader:
+    """
+    Buffered reader for one connection
+    Each recv pulls everything already pending (up to 64KB), so several small
+    framed messages are parsed from a single syscall instead of two per message
     """
-    data = b''
-    bytes_remaining = n_bytes
     
-    while bytes_remaining > 0:
-        chunk = sock.recv(bytes_remaining)
-        if not chunk:
+    def __init__(self, sock, recv_size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.buf = bytearray()  # Received but not yet consumed
+        self._chunk = bytearray(recv_size)
+        self._chunk_mv = memoryview(self._chunk)
+    
+    def _fill(self):
+        """Read whatever the socket has pending into the lookahead buffer"""
+        got = self.sock.recv_into(self._chunk_mv)
+        if not got:
             raise ConnectionError("Connection closed unexpectedly")
         
-        data += chunk
-        bytes_remaining -= len(chunk)
+        self.buf += self._chunk_mv[:got]
+        log.debug("📥 Buffered receive: %d bytes, %d pending", got, len(self.buf))
+    
+    def recv_exact(self, n_bytes):
+        """
+        Receive exactly n_bytes (guaranteed complete reception)
+        Served from the lookahead buffer, refilled only when it runs short
+        Returns a bytearray (the slice is the only copy made)
+        """
+        while len(self.buf) < n_bytes:
+            self._fill()
+        
+        # A memoryview into self.buf would block the del below, so the slice
+        # copy is kept; wrapping it in bytes() would copy a second time
+        data = self.buf[:n_bytes]
+        del self.buf[:n_bytes]
+        return data
+    
+    def recv_uint(self, fmt):
+        """
+        Receive one fixed-size integer described by a Struct (e.g. _U64)
+        Parsed in place from the lookahead buffer, no intermediate copy
+        """
+        while len(self.buf) < fmt.size:
+            self._fill()
         
-        if bytes_remaining > 0:
-            print(f"📥 Partial receive: {len(chunk)} bytes, {bytes_remaining} remaining")
+        value = fmt.unpack_from(self.buf)[0]
+        del self.buf[:fmt.size]
+        return value
+    
+    def recv_message(self, max_len=MAX_MESSAGE_SIZE):
+        """
+        Receive a length-prefixed message (robust reception)
+        Protocol: [4-byte length][message data]
+        Returns the message as a bytearray, rejects messages larger than max_len
+        """
+        try:
+            # First, the 4-byte length header
+            while len(self.buf) < 4:
+                self._fill()
+            
+            # Unpack length from network byte order (big-endian)
+            message_length = _U32.unpack_from(self.buf)[0]
+            log.debug("📏 Expected message length: %d bytes", message_length)
+            
+            # Validate message length (prevent memory attacks)
+            if message_length > max_len:
+                raise ValueError(f"Message too large: {message_length} bytes")
+            
+            # Then the message data (often already buffered with the header)
+            while len(self.buf) < 4 + message_length:
+                self._fill()
+            
+            message_data = self.buf[4:4 + message_length]
+            del self.buf[:4 + message_length]
+            log.debug("📥 Received complete message: %d bytes", len(message_data))
+            
+            return message_data
+        except Exception as e:
+            log.error("❌ Error receiving message: %s", e)
+            return None
     
-    return data
+    def recv_into_file(self, fileobj, n_bytes):
+        """
+        Receive exactly n_bytes into fileobj
+        Flushes already-buffered bytes first, then streams the rest from the socket
+        """
+        fd = fileobj.fileno()
+        buffered = min(len(self.buf), n_bytes)
+        
+        # os.write may write less than asked, loop until the data is on disk
+        written = 0
+        with memoryview(self.buf) as pending:
+            while written < buffered:
+                written += os.write(fd, pending[written:buffered])
+        del self.buf[:buffered]
+        
+        if n_bytes > buffered:
+            recv_exact_into(self.sock, fileobj, n_bytes - buffered)
+        
+        return n_bytes
 
-def recv_message(sock):
+def recv_exact_into(sock, fileobj, n_bytes, chunk_size=FILE_CHUNK_SIZE):
     """
-    Receive a length-prefixed message (robust reception)
-    Protocol: [4-byte length][message data]
-    Returns the message as bytes
+    Receive exactly n_bytes from socket and write them to fileobj
+    Uses the zero-copy splice path when available (see recv_splice_into);
+    otherwise, or if splice turns out to be unsupported, copies through the
+    shared transfer buffer and writes straight to the file descriptor
     """
-    try:
-        # First, receive the 4-byte length header
-        length_header = recv_exact(sock, 4)
-        
-        # Unpack length from network byte order (big-endian)
-        message_length = struct.unpack('!I', length_header)[0]
-        print(f"📏 Expected message length: {message_length} bytes")
-        
-        # Validate message length (prevent memory attacks)
-        if message_length > 1024 * 1024 * 100:  # 100MB limit
-            raise ValueError(f"Message too large: {message_length} bytes")
+    bytes_done = 0
+    if USE_SPLICE and hasattr(os, 'splice'):
+        bytes_done = recv_splice_into(sock, fileobj, n_bytes, chunk_size)
+        if bytes_done == n_bytes:
+            return n_bytes
+    
+    fd = fileobj.fileno()
+    view = _XFER_MV
+    chunk_size = min(chunk_size, len(_XFER_BUF))
+    bytes_remaining = n_bytes - bytes_done
+    last_logged = bytes_done
+    show_progress = log.isEnabledFor(logging.DEBUG)
+    
+    while bytes_remaining > 0:
+        got = sock.recv_into(view, min(chunk_size, bytes_remaining))
+        if not got:
+            raise ConnectionError("Connection closed unexpectedly")
         
-        # Receive the exact amount of message data
-        message_data = recv_exact(sock, message_length)
-        print(f"📥 Received complete message: {len(message_data)} bytes")
+        # os.write may write less than asked, loop until the chunk is on disk
+        written = 0
+        while written < got:
+            written += os.write(fd, view[written:got])
+        bytes_remaining -= got
         
-        return message_data
-    except Exception as e:
-        print(f"❌ Error receiving message: {e}")
-        return None
+        # Progress indicator (throttled)
+        bytes_received = n_bytes - bytes_remaining
+        if show_progress and (bytes_received - last_logged >= PROGRESS_INTERVAL or bytes_remaining == 0):
+            progress = (bytes_received / n_bytes) * 100
+            log.debug("📥 File progress: %s/%s bytes (%.1f%%)", f"{bytes_received:,}", f"{n_bytes:,}", progress)
+            last_logged = bytes_received
+    
+    return n_bytes
 
-def recv_file(sock, save_path):
+def recv_file(reader, save_path):
     """
     Receive a file with metadata (filename + size + content)
-    Protocol: [filename_length][filename][file_size][file_content]
+    Protocol: [2-byte filename_length][filename][8-byte file_size][file_content]
     """
     try:
-        # Receive filename
-        filename_data = recv_message(sock)
-        if not filename_data:
-            return False
-        
-        filename = filename_data.decode('utf-8')
-        print(f"📁 Receiving file: {filename}")
+        # Receive filename (2-byte length prefix, so at most 64KB)
+        filename_length = reader.recv_uint(_U16)
+        filename = reader.recv_exact(filename_length).decode('utf-8')
+        log.info("📁 Receiving file: %s", filename)
         
         # Receive file size (8 bytes)
-        file_size_data = recv_exact(sock, 8)
-        file_size = struct.unpack('!Q', file_size_data)[0]
-        print(f"📏 File size: {file_size:,} bytes")
+        file_size = reader.recv_uint(_U64)
+        log.info("📏 File size: %s bytes", f"{file_size:,}")
         
         # Prepare save path
         if save_path.endswith('/') or save_path.endswith('\\'):
@@ -120,29 +272,87 @@ def recv_file(sock, save_path):
         else:
             full_save_path = save_path
         
-        # Receive file content
-        bytes_received = 0
-        chunk_size = 64 * 1024  # 64KB chunks
-        
-        with open(full_save_path, 'wb') as f:
-            while bytes_received < file_size:
-                remaining = file_size - bytes_received
-                current_chunk_size = min(chunk_size, remaining)
-                
-                chunk = recv_exact(sock, current_chunk_size)
-                f.write(chunk)
-                bytes_received += len(chunk)
-                
-                # Progress indicator
-                progress = (bytes_received / file_size) * 100
-                print(f"📥 File progress: {bytes_received:,}/{file_size:,} bytes ({progress:.1f}%)")
+        # Receive file content straight into the file (unbuffered, 1MB chunks)
+        with open(full_save_path, 'wb', buffering=0) as f:
+            reader.recv_into_file(f, file_size)
         
-        print(f"✅ File received successfully: {full_save_path}")
+        log.info("✅ File received successfully: %s", full_save_path)
         return True
     except Exception as e:
-        print(f"❌ Error receiving file: {e}")
+        log.error("❌ Error receiving file: %s", e)
         return False
 
+def recv_splice_into(sock, fileobj, n_bytes, chunk_size=FILE_CHUNK_SIZE):
+    """
+    Receive up to n_bytes from socket into fileobj without user-space copies
+    Uses os.splice through a pipe: data stays in kernel memory (Linux only)
+    Returns the bytes written; fewer than n_bytes only if the first splice
+    fails with EINVAL/ENOSYS, in which case the caller finishes by copying
+    """
+    fd = fileobj.fileno()
+    sock_fd = sock.fileno()
+    pipe_r, pipe_w = os.pipe()
+    bytes_remaining = n_bytes
+    last_logged = 0
+    show_progress = log.isEnabledFor(logging.DEBUG)
+    
+    try:
+        # A larger pipe lets each splice move a full chunk (default is 64KB)
+        if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+            try:
+                fcntl.fcntl(pipe_w, fcntl.F_SETPIPE_SZ, chunk_size)
+            except OSError:
+                pass
+        
+        first = True
+        while bytes_remaining > 0:
+            try:
+                got = os.splice(sock_fd, pipe_w, min(chunk_size, bytes_remaining))
+            except OSError as e:
+                if first and e.errno in _SPLICE_UNSUPPORTED:
+                    log.debug("📥 Socket does not support splice (%s), copying instead", e)
+                    break
+                raise
+            if not got:
+                raise ConnectionError("Connection closed unexpectedly")
+            
+            # Drain the pipe into the file
+            moved = 0
+            unsupported = False
+            while moved < got:
+                try:
+                    moved += os.splice(pipe_r, fd, got - moved)
+                except OSError as e:
+                    if not (first and e.errno in _SPLICE_UNSUPPORTED):
+                        raise
+                    log.debug("📥 File does not support splice (%s), copying instead", e)
+                    unsupported = True
+                    
+                    # The data is already in the pipe: move it through user space
+                    while moved < got:
+                        data = os.read(pipe_r, got - moved)
+                        written = 0
+                        while written < len(data):
+                            written += os.write(fd, data[written:])
+                        moved += len(data)
+            bytes_remaining -= got
+            first = False
+            
+            # Progress indicator (throttled)
+            bytes_received = n_bytes - bytes_remaining
+            if show_progress and (bytes_received - last_logged >= PROGRESS_INTERVAL or bytes_remaining == 0):
+                progress = (bytes_received / n_bytes) * 100
+                log.debug("📥 File progress: %s/%s bytes (%.1f%%)", f"{bytes_received:,}", f"{n_bytes:,}", progress)
+                last_logged = bytes_received
+            
+            if unsupported:
+                break
+    finally:
+        os.close(pipe_r)
+        os.close(pipe_w)
+    
+    return n_bytes - bytes_remaining
+
 def get_local_ip():
     """Get the local IP address of this machine"""
     try:
@@ -165,22 +375,23 @@ def parse_arguments():
             try:
                 server_port = int(sys.argv[2])
             except ValueError:
-                print("❌ Invalid port number")
+                log.error("❌ Invalid port number")
                 server_port = default_port
         else:
             server_port = default_port
-        print(f"🎯 Using command line args: {server_ip}:{server_port}")
+        log.info("🎯 Using command line args: %s:%s", server_ip, server_port)
     else:
         server_ip = default_ip
         server_port = default_port
-        print(f"🎯 Using defaults: {server_ip}:{server_port}")
+        log.info("🎯 Using defaults: %s:%s", server_ip, server_port)
     
     return server_ip, server_port
 
 def main():
-    print("=== Enhanced TP1 TCP Client - Telecom Paris ===")
-    print("🚀 Features: Length-prefixed messages, endianness handling, large file support")
-    print("💡 Usage: python3 client-modified.py [server_ip] [port]")
+    logging.basicConfig(level=LOG_LEVEL, format='%(message)s', stream=sys.stdout)
+    log.info("=== Enhanced TP1 TCP Client - Telecom Paris ===")
+    log.info("🚀 Features: Length-prefixed messages, endianness handling, large file support")
+    log.info("💡 Usage: python3 client-modified.py [server_ip] [port]")
     
     # Parse command line arguments
     server_ip, server_port = parse_arguments()
@@ -190,107 +401,91 @@ def main():
     client_port = "9001"  # Client's own port (can be different from server port)
     client_ip = get_local_ip()  # Get actual IP address
     
-    print(f"📡 Client machine: {machine_name}")
-    print(f"📡 Client IP: {client_ip}")
-    print(f"📡 Client port: {client_port}")
-    print(f"Connecting to enhanced server at {server_ip}:{server_port}...")
+    log.info("📡 Client machine: %s", machine_name)
+    log.info("📡 Client IP: %s", client_ip)
+    log.info("📡 Client port: %s", client_port)
+    log.info("Connecting to enhanced server at %s:%s...", server_ip, server_port)
     
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
+            # Tune before connect so the receive buffer shapes the TCP window
+            tune_socket(client_socket)
             client_socket.connect((server_ip, server_port))
-            print("✅ Connected to enhanced server!")
+            log.info("✅ Connected to enhanced server!")
+            reader = MessageReader(client_socket)
             
             # Step 1: Receive "Hello" message using robust protocol
-            print("📥 Waiting for Hello message...")
-            hello_data = recv_message(client_socket)
+            log.info("📥 Waiting for Hello message...")
+            hello_data = reader.recv_message()
             
             if hello_data:
-                server_message = hello_data.decode('utf-8')
-                print(f"📨 Server says: {server_message}")
+                server_message = hello_data.decode('ascii', 'replace')
+                log.info("📨 Server says: %s", server_message)
                 
-                if server_message == "Hello":
-                    print("✅ Received Hello from server!")
+                if hello_data == HELLO_MSG:
+                    log.info("✅ Received Hello from server!")
                     
                     # Step 2: Send response with Port + Machine + IP using robust protocol
                     client_response = f"{client_port}+{machine_name}+{client_ip}"
-                    print(f"📤 Sending response: {client_response}")
+                    log.info("📤 Sending response: %s", client_response)
                     
-                    if send_message(client_socket, client_response):
-                        print("✅ Response sent successfully!")
+                    if send_text(client_socket, client_response):
+                        log.info("✅ Response sent successfully!")
                         
                         # Step 3: Receive large test message
-                        print("📥 Waiting for large test message...")
-                        large_data = recv_message(client_socket)
+                        log.info("📥 Waiting for large test message...")
+                        large_data = reader.recv_message()
                         
                         if large_data:
-                            large_message = large_data.decode('utf-8')
-                            print(f"📨 Received large message: {len(large_message):,} bytes")
-                            print(f"🔍 Message preview: '{large_message[:50]}...'")
+                            large_message = large_data.decode('ascii', 'replace')
+                            log.info("📨 Received large message: %s bytes", f"{len(large_message):,}")
+                            log.info("🔍 Message preview: '%s...'", large_message[:50])
                         
-                        # Step 4: Try to receive a file (if server sends one)
-                        print("📁 Checking for file transfer...")
+                        # Step 4: Receive a file (if server sends one)
+                        log.info("📁 Checking for file transfer...")
                         try:
-                            # Set a short timeout to check if file is coming
-                            client_socket.settimeout(5.0)
-                            
-                            # Try to receive filename
-                            filename_data = recv_message(client_socket)
-                            if filename_data:
-                                # File is coming, reset timeout and receive it
-                                client_socket.settimeout(None)
-                                
-                                # Put the filename back and receive the full file
-                                # (This is a simplified approach - in real implementation, 
-                                # you'd have a protocol to indicate file transfer)
-                                filename = filename_data.decode('utf-8')
-                                print(f"📁 File transfer detected: {filename}")
+                            # 1-byte opcode tells us whether a file follows
+                            flag = reader.recv_exact(1)
+                            if flag == FILE_FOLLOWS:
+                                filename_length = reader.recv_uint(_U16)
+                                filename = reader.recv_exact(filename_length).decode('utf-8')
+                                log.info("📁 File transfer detected: %s", filename)
                                 
                                 # Receive file size
-                                file_size_data = recv_exact(client_socket, 8)
-                                file_size = struct.unpack('!Q', file_size_data)[0]
-                                print(f"📏 File size: {file_size:,} bytes")
+                                file_size = reader.recv_uint(_U64)
+                                log.info("📏 File size: %s bytes", f"{file_size:,}")
                                 
                                 # Save file with prefix
                                 save_filename = f"received_{filename}"
-                                bytes_received = 0
                                 
-                                with open(save_filename, 'wb') as f:
-                                    while bytes_received < file_size:
-                                        chunk_size = min(64*1024, file_size - bytes_received)
-                                        chunk = recv_exact(client_socket, chunk_size)
-                                        f.write(chunk)
-                                        bytes_received += len(chunk)
-                                        
-                                        progress = (bytes_received / file_size) * 100
-                                        print(f"📥 File progress: {bytes_received:,}/{file_size:,} bytes ({progress:.1f}%)")
+                                with open(save_filename, 'wb', buffering=0) as f:
+                                    reader.recv_into_file(f, file_size)
                                 
-                                print(f"✅ File saved as: {save_filename}")
+                                log.info("✅ File saved as: %s", save_filename)
+                            else:
+                                log.info("📝 No file transfer (end of session)")
                                 
-                        except socket.timeout:
-                            print("📝 No file transfer (timeout - normal)")
                         except Exception as file_error:
-                            print(f"⚠️ File transfer issue: {file_error}")
-                        finally:
-                            client_socket.settimeout(None)
+                            log.warning("⚠️ File transfer issue: %s", file_error)
                         
-                        print("✅ Enhanced protocol completed successfully!")
-                        print("🎉 All transfers finished!")
+                        log.info("✅ Enhanced protocol completed successfully!")
+                        log.info("🎉 All transfers finished!")
                         
                         # Protocol is complete - exit cleanly
                         return
                     else:
-                        print("❌ Failed to send response")
+                        log.error("❌ Failed to send response")
                 else:
-                    print(f"⚠️ Unexpected message from server: {server_message}")
+                    log.warning("⚠️ Unexpected message from server: %s", server_message)
             else:
-                print("❌ No Hello message received from server")
+                log.error("❌ No Hello message received from server")
                 
     except ConnectionRefusedError:
-        print("❌ Connection refused. Make sure enhanced server is running first.")
+        log.error("❌ Connection refused. Make sure enhanced server is running first.")
     except Exception as e:
-        print(f"❌ Error: {e}")
+        log.error("❌ Error: %s", e)
     
-    print("👋 Enhanced client disconnected")
+    log.info("👋 Enhanced client disconnected")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -8,223 +8,388 @@ Features:
 - Complete data reception guarantees
 - Large file transfer support
 - Metadata tracking
+- Concurrent clients (asyncio event loop, one worker process per core)
 """
 
+import asyncio
 import socket
 import struct
 import os
+import sys
 import time
+import signal
+import logging
 
-def send_message(sock, message):
+try:
+    import ctypes  # Used for prctl(PR_SET_PDEATHSIG) on Linux
+except ImportError:
+    ctypes = None
+
+# Wire integers in network byte order (big-endian), pre-compiled once so
+# each message skips the format-string lookup
+_U16 = struct.Struct('!H')  # Filename length (2 bytes)
+_U32 = struct.Struct('!I')  # Message length header (4 bytes)
+_U64 = struct.Struct('!Q')  # File size (8 bytes)
+
+# Largest control message accepted by recv_message (file content is streamed)
+MAX_MESSAGE_SIZE = 1024 * 1024  # 1MB
+
+# Protocol messages, encoded once instead of on every connection
+HELLO_MSG = b"Hello"
+LARGE_TEST_MESSAGE = b"This is a large test message! " * 1000  # ~30KB message
+
+# Session opcodes: 1 byte sent after the large test message
+END_OF_SESSION = b'\x00'  # No more data, server is closing
+FILE_FOLLOWS = b'\x01'    # A file transfer follows (send_file protocol)
+
+# Socket tuning
+ENABLE_NODELAY = True  # Disable Nagle so short handshake messages go out immediately
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # 4MB send buffer for bulk transfers
+
+# Logging (per-message details are DEBUG, formatted only when enabled)
+LOG_LEVEL = logging.INFO
+
+log = logging.getLogger(__name__)
+
+# Multi-core: worker processes share the port via SO_REUSEPORT (kernel balances accept)
+WORKER_PROCESSES = os.cpu_count() or 1
+PR_SET_PDEATHSIG = 1  # linux/prctl.h
+
+def tune_socket(sock):
     """
-    Send a message with length prefix (robust transmission)
+    Apply TCP options for low-latency messages and high-throughput transfers
+    """
+    if ENABLE_NODELAY:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+
+async def send_bytes(writer, message_bytes):
+    """
+    Send an already-encoded message with length prefix (robust transmission)
     Protocol: [4-byte length][message data]
     Length is in network byte order (big-endian)
     """
     try:
-        # Encode message to bytes
-        if isinstance(message, str):
-            message_bytes = message.encode('utf-8')
-        else:
-            message_bytes = message
-        
         # Get message length
         message_length = len(message_bytes)
         
         # Pack length as 4-byte unsigned integer in network byte order (big-endian)
-        length_header = struct.pack('!I', message_length)  # '!' = network byte order
-        
-        # Send length header first (4 bytes)
-        sock.sendall(length_header)
-        print(f"📏 Sent length header: {message_length} bytes")
+        length_header = _U32.pack(message_length)
         
-        # Send the actual message data
-        sock.sendall(message_bytes)
-        print(f"📤 Sent message: {message_length} bytes")
+        # Queue header and data together, the transport sends them in one go
+        writer.writelines([length_header, message_bytes])
+        await writer.drain()
+        log.debug("📏 Sent length header: %d bytes", message_length)
+        log.debug("📤 Sent message: %d bytes", message_length)
         
         return True
     except Exception as e:
-        print(f"❌ Error sending message: {e}")
+        log.error("❌ Error sending message: %s", e)
         return False
 
-def recv_exact(sock, n_bytes):
+async def send_text(writer, text):
     """
-    Receive exactly n_bytes from socket (guaranteed complete reception)
-    Handles partial receives that can happen with TCP
+    Encode and send a text message (ASCII fast path, UTF-8 otherwise)
     """
-    data = b''
-    bytes_remaining = n_bytes
-    
-    while bytes_remaining > 0:
-        chunk = sock.recv(bytes_remaining)
-        if not chunk:
-            raise ConnectionError("Connection closed unexpectedly")
-        
-        data += chunk
-        bytes_remaining -= len(chunk)
-        
-        if bytes_remaining > 0:
-            print(f"📥 Partial receive: {len(chunk)} bytes, {bytes_remaining} remaining")
-    
-    return data
+    return await send_bytes(writer, text.encode('ascii' if text.isascii() else 'utf-8'))
 
-def recv_message(sock):
+async def recv_message(reader, max_len=MAX_MESSAGE_SIZE):
     """
     Receive a length-prefixed message (robust reception)
     Protocol: [4-byte length][message data]
-    Returns the message as bytes
+    Returns the message as bytes, rejects messages larger than max_len
     """
     try:
         # First, receive the 4-byte length header
-        length_header = recv_exact(sock, 4)
+        length_header = await reader.readexactly(4)
         
         # Unpack length from network byte order (big-endian)
-        message_length = struct.unpack('!I', length_header)[0]
-        print(f"📏 Expected message length: {message_length} bytes")
+        message_length = _U32.unpack_from(length_header)[0]
+        log.debug("📏 Expected message length: %d bytes", message_length)
         
         # Validate message length (prevent memory attacks)
-        if message_length > 1024 * 1024 * 100:  # 100MB limit
+        if message_length > max_len:
             raise ValueError(f"Message too large: {message_length} bytes")
         
         # Receive the exact amount of message data
-        message_data = recv_exact(sock, message_length)
-        print(f"📥 Received complete message: {len(message_data)} bytes")
+        # (readexactly handles partial TCP receives)
+        message_data = await reader.readexactly(message_length)
+        log.debug("📥 Received complete message: %d bytes", len(message_data))
         
         return message_data
+    except asyncio.IncompleteReadError:
+        log.error("❌ Error receiving message: Connection closed unexpectedly")
+        return None
     except Exception as e:
-        print(f"❌ Error receiving message: {e}")
+        log.error("❌ Error receiving message: %s", e)
         return None
 
-def send_file(sock, file_path):
+async def send_file(writer, file_path):
     """
-    Send a file with metadata (filename + size + content)
-    Protocol: [filename_length][filename][file_size][file_content]
+    Send a file with metadata (opcode + filename + size + content)
+    Protocol: [FILE_FOLLOWS][2-byte filename_length][filename][8-byte file_size][file_content]
+    Sends END_OF_SESSION instead if the file metadata cannot be prepared
     """
+    # Build the metadata preamble before choosing the opcode, so the client
+    # always gets one even when the file is missing or its name doesn't fit
     try:
-        if not os.path.exists(file_path):
-            print(f"❌ File not found: {file_path}")
-            return False
-        
         file_size = os.path.getsize(file_path)
         filename = os.path.basename(file_path)
+        filename_bytes = filename.encode('utf-8')
+        preamble = [
+            FILE_FOLLOWS,
+            _U16.pack(len(filename_bytes)),
+            filename_bytes,
+            _U64.pack(file_size),  # 8-byte unsigned long
+        ]
+    except (OSError, UnicodeError, struct.error) as e:
+        log.error("❌ Cannot send file %s: %s", file_path, e)
+        writer.write(END_OF_SESSION)
+        await writer.drain()
+        return False
+    
+    try:
+        log.info("📁 Preparing to send file:")
+        log.info("   Name: %s", filename)
+        log.info("   Size: %s bytes", f"{file_size:,}")
         
-        print(f"📁 Preparing to send file:")
-        print(f"   Name: {filename}")
-        print(f"   Size: {file_size:,} bytes")
-        
-        # Send filename first
-        if not send_message(sock, filename):
-            return False
-        
-        # Send file size as metadata
-        file_size_bytes = struct.pack('!Q', file_size)  # 8-byte unsigned long
-        sock.sendall(file_size_bytes)
-        print(f"📏 Sent file size: {file_size:,} bytes")
+        # Send opcode + metadata preamble as one gathered write (one send syscall):
+        # opcode, filename (length-prefixed) and file size land in the same segment
+        writer.writelines(preamble)
+        await writer.drain()
+        log.info("📏 Sent filename (%d bytes) and file size: %s bytes", len(filename_bytes), f"{file_size:,}")
         
-        # Send file content in chunks
+        # Send file content: loop.sendfile uses sendfile(2) where available
+        # (and falls back to read/write otherwise) while other clients keep running
+        # (an empty file has no content to send, and sendfile rejects count=0)
         bytes_sent = 0
-        chunk_size = 64 * 1024  # 64KB chunks
+        if file_size > 0:
+            loop = asyncio.get_running_loop()
+            with open(file_path, 'rb') as f:
+                bytes_sent = await loop.sendfile(writer.transport, f, 0, file_size)
         
-        with open(file_path, 'rb') as f:
-            while bytes_sent < file_size:
-                remaining = file_size - bytes_sent
-                current_chunk_size = min(chunk_size, remaining)
-                
-                chunk = f.read(current_chunk_size)
-                if not chunk:
-                    break
-                
-                sock.sendall(chunk)
-                bytes_sent += len(chunk)
-                
-                # Progress indicator
-                progress = (bytes_sent / file_size) * 100
-                print(f"📤 File progress: {bytes_sent:,}/{file_size:,} bytes ({progress:.1f}%)")
-        
-        print(f"✅ File sent successfully: {bytes_sent:,} bytes")
+        log.info("✅ File sent successfully: %s bytes", f"{bytes_sent:,}")
         return True
     except Exception as e:
-        print(f"❌ Error sending file: {e}")
+        log.error("❌ Error sending file: %s", e)
         return False
 
+async def handle_client(reader, writer):
+    """
+    Run the enhanced protocol with one connected client
+    Called by the event loop for every new connection
+    """
+    addr = writer.get_extra_info('peername')
+    log.info("✅ Client connected from %s", addr)
+    
+    try:
+        tune_socket(writer.get_extra_info('socket'))
+        
+        # Step 1: Send "Hello" using robust protocol
+        log.info("📤 Sending Hello message...")
+        if not await send_bytes(writer, HELLO_MSG):
+            log.error("❌ Failed to send Hello message")
+            return
+        
+        # Step 2: Receive client response using robust protocol
+        log.info("📥 Waiting for client response...")
+        client_data = await recv_message(reader)
+        
+        if client_data:
+            client_response = client_data.decode('utf-8')
+            log.info("📨 Client response: %s", client_response)
+            
+            # Parse client response (Port+Machine+IP)
+            if '+' in client_response:
+                parts = client_response.split('+')
+                if len(parts) == 3:
+                    client_port = parts[0]
+                    client_machine = parts[1]
+                    client_ip = parts[2]
+                    
+                    log.info("📋 Parsed client info:")
+                    log.info("   Port: %s", client_port)
+                    log.info("   Machine: %s", client_machine)
+                    log.info("   IP: %s", client_ip)
+                    
+                    log.info("✅ Enhanced handshake successful!")
+                    
+                    # Step 3: Demonstrate large message capability
+                    log.info("📤 Sending large test message (%d bytes)...", len(LARGE_TEST_MESSAGE))
+                    
+                    if await send_bytes(writer, LARGE_TEST_MESSAGE):
+                        log.info("✅ Large message sent successfully!")
+                    
+                    # Optional: Send a file if it exists
+                    # (1-byte opcode tells the client whether a file follows,
+                    # send_file sends FILE_FOLLOWS together with the file metadata,
+                    # or END_OF_SESSION if the metadata cannot be prepared)
+                    test_file = "test_file.txt"
+                    file_sent = True
+                    if os.path.exists(test_file):
+                        log.info("📁 Test file found, sending: %s", test_file)
+                        file_sent = await send_file(writer, test_file)
+                    else:
+                        writer.write(END_OF_SESSION)
+                        await writer.drain()
+                    
+                    if file_sent:
+                        log.info("🎉 Enhanced protocol completed successfully!")
+                    else:
+                        log.error("❌ Enhanced protocol failed: file transfer did not complete")
+                else:
+                    log.error("❌ Invalid client response format (expected: Port+Machine+IP)")
+                    await send_text(writer, "ERROR: Invalid format")
+            else:
+                log.error("❌ Invalid client response format (missing + separator)")
+                await send_text(writer, "ERROR: Missing separator")
+        else:
+            log.error("❌ No valid response received from client")
+    except (ConnectionError, OSError) as e:
+        log.error("❌ Connection error with %s: %s", addr, e)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass  # Peer already reset the connection, nothing left to flush
+        log.info("👋 Client %s disconnected", addr)
+
+async def serve(host, port, reuse_port=False):
+    """
+    Accept clients concurrently on a single-threaded asyncio event loop
+    """
+    server = await asyncio.start_server(handle_client, host, port,
+                                        reuse_address=True, reuse_port=reuse_port)
+    
+    log.info("🔵 Enhanced server ready and listening (pid %d)...", os.getpid())
+    log.info("⏳ Waiting for client connections...")
+    
+    async with server:
+        await server.serve_forever()
+
+def run_worker(host, port, reuse_port=False):
+    """
+    Run one event loop serving clients until Ctrl+C
+    """
+    try:
+        asyncio.run(serve(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+def exit_with_parent(parent_pid):
+    """
+    Ask the kernel to send SIGTERM to this worker when the parent dies (Linux only)
+    """
+    if ctypes is None or not sys.platform.startswith('linux'):
+        return
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+    except (OSError, AttributeError):
+        return
+    
+    # The parent may already be gone before prctl took effect
+    if os.getppid() != parent_pid:
+        os.kill(os.getpid(), signal.SIGTERM)
+
+def stop_workers(pids):
+    """
+    Send SIGTERM to the given worker processes and wait for them to exit
+    Returns how many of them exited with an error
+    """
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    
+    failed = 0
+    for pid in pids:
+        while True:
+            try:
+                _, status = os.waitpid(pid, 0)
+                break
+            except KeyboardInterrupt:
+                continue
+            except ChildProcessError:
+                status = 0
+                break
+        exit_code = os.waitstatus_to_exitcode(status)
+        if exit_code != 0:
+            log.error("❌ Worker %d exited with code %d", pid, exit_code)
+            failed += 1
+    return failed
+
 def main():
-    print("=== Enhanced TP1 TCP Server - Telecom Paris ===")
-    print("🚀 Features: Length-prefixed messages, endianness handling, large file support")
+    logging.basicConfig(level=LOG_LEVEL, format='%(message)s', stream=sys.stdout)
+    log.info("=== Enhanced TP1 TCP Server - Telecom Paris ===")
+    log.info("🚀 Features: Length-prefixed messages, endianness handling, large file support")
     
     # Server configuration
     host = ''  # Listen on all interfaces
     port = 9000
     machine_name = "tp-1a201-37"  # This server represents tp-1a201-37
     
-    print(f"Starting enhanced server on port {port}...")
-    print(f"📡 Machine: {machine_name}")
+    log.info("Starting enhanced server on port %s...", port)
+    log.info("📡 Machine: %s", machine_name)
+    
+    # SIGTERM (kill, systemd stop...) shuts down cleanly, like Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_socket.bind((host, port))
-        server_socket.listen(1)
+    # Fork one worker per core when the platform supports it
+    workers = WORKER_PROCESSES
+    if not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        workers = 1
+    
+    failed_workers = 0
+    if workers == 1:
+        run_worker(host, port)
+    else:
+        log.info("🧵 Starting %d worker processes (SO_REUSEPORT)...", workers)
+        parent_pid = os.getpid()
+        children = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                # Child: serve until interrupted, never return into the fork loop
+                exit_code = 0
+                try:
+                    exit_with_parent(parent_pid)
+                    run_worker(host, port, reuse_port=True)
+                except Exception:
+                    # Set before logging: a SIGTERM from the parent may cut the log short
+                    exit_code = 1
+                    log.exception("❌ Worker %d failed", os.getpid())
+                finally:
+                    os._exit(exit_code)
+            children.append(pid)
         
-        print("🔵 Enhanced server ready and listening...")
-        print("⏳ Waiting for client connection...")
+        # Wait for whichever worker exits first (crash, bind failure...) and
+        # stop the server rather than keep running short-handed; on Ctrl+C or
+        # SIGTERM forward SIGTERM to the survivors so no orphan keeps
+        # listening on the port
+        alive = list(children)
+        try:
+            pid, status = os.wait()
+            alive.remove(pid)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if exit_code != 0:
+                log.error("❌ Worker %d exited with code %d", pid, exit_code)
+                failed_workers += 1
+            log.info("🛑 Worker %d stopped, shutting down the other workers...", pid)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            failed_workers += stop_workers(alive)
         
-        conn, addr = server_socket.accept()
-        with conn:
-            print(f"✅ Client connected from {addr}")
-            
-            # Step 1: Send "Hello" using robust protocol
-            hello_message = "Hello"
-            print(f"📤 Sending Hello message...")
-            if not send_message(conn, hello_message):
-                print("❌ Failed to send Hello message")
-                return
-            
-            # Step 2: Receive client response using robust protocol
-            print("📥 Waiting for client response...")
-            client_data = recv_message(conn)
-            
-            if client_data:
-                client_response = client_data.decode('utf-8')
-                print(f"📨 Client response: {client_response}")
-                
-                # Parse client response (Port+Machine+IP)
-                if '+' in client_response:
-                    parts = client_response.split('+')
-                    if len(parts) == 3:
-                        client_port = parts[0]
-                        client_machine = parts[1]
-                        client_ip = parts[2]
-                        
-                        print(f"📋 Parsed client info:")
-                        print(f"   Port: {client_port}")
-                        print(f"   Machine: {client_machine}")
-                        print(f"   IP: {client_ip}")
-                        
-                        print("✅ Enhanced handshake successful!")
-                        
-                        # Step 3: Demonstrate large message capability
-                        large_message = "This is a large test message! " * 1000  # ~30KB message
-                        print(f"📤 Sending large test message ({len(large_message)} bytes)...")
-                        
-                        if send_message(conn, large_message):
-                            print("✅ Large message sent successfully!")
-                        
-                        # Optional: Send a file if it exists
-                        test_file = "test_file.txt"
-                        if os.path.exists(test_file):
-                            print(f"📁 Test file found, sending: {test_file}")
-                            send_file(conn, test_file)
-                        
-                        print("🎉 Enhanced protocol completed successfully!")
-                    else:
-                        print("❌ Invalid client response format (expected: Port+Machine+IP)")
-                        send_message(conn, "ERROR: Invalid format")
-                else:
-                    print("❌ Invalid client response format (missing + separator)")
-                    send_message(conn, "ERROR: Missing separator")
-            else:
-                print("❌ No valid response received from client")
+        if failed_workers:
+            log.error("❌ %d of %d worker processes failed", failed_workers, workers)
+    
+    log.info("👋 Enhanced server shutdown")
     
-    print("👋 Enhanced server shutdown")
+    if failed_workers:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file